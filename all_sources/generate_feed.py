@@ -0,0 +1,216 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+import argparse
+import heapq
+import itertools
+import os
+
+ATOM = 'http://www.w3.org/2005/Atom'
+ET.register_namespace('atom', ATOM)
+
+# Feeds written by the per-source generators, relative to the repository root
+SOURCES = [
+    {'name': 'sparta_main', 'path': 'sparta_main/sparta_rss.xml'},
+    {'name': 'sparta_kids', 'path': 'sparta_kids/sparta_rss.xml'},
+    {'name': 'kia_updates', 'path': 'kia_updates/kia_updates.xml'},
+    {'name': 'ui_blog', 'path': 'ui_blog/ui_blog_rss.xml'},
+]
+
+# Items without a usable pubDate sort after everything else
+OLDEST = datetime.min.replace(tzinfo=timezone.utc)
+
+
+class AllSourcesRSSGenerator:
+    def __init__(self, base_url='', window=50):
+        # Public URL the feeds are published under; relative links are used when empty
+        self.base_url = base_url.rstrip('/')
+        self.window = window
+        self.repo_root = '..'
+        self.filename = 'all_sources.xml'
+        self.opml_filename = 'sources.opml'
+        # WebSub hub advertised in the merged feed; websub_hub/ping_hub.py notifies it after the deploy
+        self.hub_url = os.environ.get('WEBSUB_HUB_URL', '')
+
+    def feed_url(self, path):
+        """Public URL of a feed file"""
+        return f"{self.base_url}/{path}" if self.base_url else path
+
+    def parse_pub_date(self, item):
+        """Parse an item's RFC 822 pubDate into an aware datetime"""
+        text = item.findtext('pubDate')
+        if not text:
+            return OLDEST
+        try:
+            pub_date = parsedate_to_datetime(text.strip())
+        except (TypeError, ValueError):
+            return OLDEST
+        return pub_date if pub_date.tzinfo else pub_date.replace(tzinfo=timezone.utc)
+
+    def read_channel(self, path):
+        """Read a feed file and return (channel title, channel link, list of item elements)"""
+        title, link, items = '', '', []
+        for _, elem in ET.iterparse(path, events=('end',)):
+            # Pretty-printed input would otherwise leave whitespace all over the merged output
+            if elem.text is not None and not elem.text.strip():
+                elem.text = None
+            if elem.tail is not None and not elem.tail.strip():
+                elem.tail = None
+            if elem.tag == 'item':
+                items.append(elem)
+            elif elem.tag == 'title' and not title and not items:
+                title = elem.text or ''
+            elif elem.tag == 'link' and not link and not items:
+                link = elem.text or ''
+        return title, link, items
+
+    def item_stream(self, items):
+        """Yield (pubDate, guid, item) for one source, newest first.
+
+        Sources only hold a handful of items, so sorting them one by one is cheap; the
+        combined list is never built or sorted.
+        """
+        entries = []
+        for item in items:
+            guid = item.findtext('guid') or item.findtext('link') or item.findtext('title') or ''
+            entries.append((self.parse_pub_date(item), guid, item))
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        yield from entries
+
+    def source_stream(self, source):
+        """Yield the items of one source feed, tagged with an RSS <source> element"""
+        path = os.path.join(self.repo_root, source['path'])
+        if not os.path.exists(path):
+            print(f"Skipping {source['name']}: {path} not found")
+            return
+        title, _, items = self.read_channel(path)
+        url = self.feed_url(source['path'])
+        for pub_date, guid, item in self.item_stream(items):
+            for old in item.findall('source'):
+                item.remove(old)
+            ET.SubElement(item, 'source', url=url).text = title
+            yield pub_date, guid, item
+
+    def merge(self, streams):
+        """Lazily k-way merge newest-first streams, dropping duplicate GUIDs, up to the window size"""
+        seen = set()
+        merged = heapq.merge(*streams, key=lambda entry: entry[0], reverse=True)
+        unique = ((pub_date, guid, item) for pub_date, guid, item in merged if not (guid in seen or seen.add(guid)))
+        return itertools.islice(unique, self.window)
+
+    def build_items(self, only_source=None):
+        """Return the merged items, rebuilding everything or only the given source"""
+        if only_source is None or not os.path.exists(self.filename):
+            return self.merge(self.source_stream(source) for source in SOURCES)
+
+        # Incremental: keep the other sources' items from the current aggregate and merge in the rebuilt source
+        source = next(source for source in SOURCES if source['name'] == only_source)
+        url = self.feed_url(source['path'])
+        _, _, items = self.read_channel(self.filename)
+        kept = (entry for entry in self.item_stream(items) if entry[2].find('source').get('url') != url)
+        return self.merge([kept, self.source_stream(source)])
+
+    def create_rss_feed(self, items):
+        """Create the merged RSS feed from (pubDate, guid, item) entries"""
+        rss = ET.Element('rss', version='2.0')
+        channel = ET.SubElement(rss, 'channel')
+
+        # Add channel metadata
+        ET.SubElement(channel, 'title').text = 'Alle feeds (onofficieel)'
+        ET.SubElement(channel, 'link').text = self.feed_url('all_sources/' + self.filename)
+        ET.SubElement(channel, 'description').text = 'Sparta Rotterdam, Kidsclub, Kia updates en UI.com blog in één feed'
+        ET.SubElement(channel, 'language').text = 'nl-NL'
+        last_build_date = ET.SubElement(channel, 'lastBuildDate')
+        ET.SubElement(channel, 'generator').text = 'All Sources RSS Generator'
+
+        # Self and hub links, so readers can subscribe through WebSub instead of polling
+        if self.base_url:
+            ET.SubElement(channel, f'{{{ATOM}}}link', href=self.feed_url('all_sources/' + self.filename),
+                          rel='self', type='application/rss+xml')
+            if self.hub_url:
+                ET.SubElement(channel, f'{{{ATOM}}}link', href=self.hub_url, rel='hub')
+
+        count = 0
+        for _, _, item in items:
+            channel.append(item)
+            count += 1
+        print(f"Merged {count} items")
+        return self.render(rss, last_build_date, self.filename)
+
+    def create_opml(self):
+        """Create an OPML index of the per-source feeds and the merged feed"""
+        opml = ET.Element('opml', version='2.0')
+        head = ET.SubElement(opml, 'head')
+        ET.SubElement(head, 'title').text = 'Feeds van websites zonder feed'
+        date_created = ET.SubElement(head, 'dateCreated')
+        body = ET.SubElement(opml, 'body')
+
+        feeds = [(source['path'], os.path.join(self.repo_root, source['path'])) for source in SOURCES]
+        feeds.append(('all_sources/' + self.filename, self.filename))
+        for path, local_path in feeds:
+            if not os.path.exists(local_path):
+                continue
+            title, link, _ = self.read_channel(local_path)
+            ET.SubElement(body, 'outline', type='rss', text=title, title=title,
+                          xmlUrl=self.feed_url(path), htmlUrl=link)
+        return self.render(opml, date_created, self.opml_filename)
+
+    def render(self, root, date_element, path):
+        """Pretty-print root, keeping the date of the file at path when nothing else changed.
+
+        date_element (lastBuildDate or dateCreated) only gets the current time when the
+        content differs from the previous output, so an unchanged feed stays byte-identical
+        and is neither rewritten nor pinged.
+        """
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                previous = f.read()
+            try:
+                date_element.text = ET.fromstring(previous).findtext(f'.//{date_element.tag}')
+            except ET.ParseError:
+                date_element.text = None
+            if date_element.text:
+                content = minidom.parseString(ET.tostring(root, encoding='unicode')).toprettyxml(indent='  ')
+                if content == previous:
+                    return content
+
+        date_element.text = datetime.now(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S +0000')
+        return minidom.parseString(ET.tostring(root, encoding='unicode')).toprettyxml(indent='  ')
+
+    def save_rss_feed(self, rss_content, filename=None):
+        """Save RSS feed to file, leaving it untouched when the content did not change"""
+        filename = filename or self.filename
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as f:
+                if f.read() == rss_content:
+                    print(f"RSS feed {filename} is unchanged")
+                    return
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(rss_content)
+        print(f"RSS feed saved to {filename}")
+
+    def generate_feed(self, only_source=None):
+        """Main method to generate the merged RSS feed"""
+        if only_source:
+            print(f"Updating merged feed with {only_source}...")
+        else:
+            print("Merging all source feeds...")
+        return self.create_rss_feed(self.build_items(only_source))
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Merge the per-source feeds into one feed and an OPML index')
+    parser.add_argument('--window', type=int, default=50, help='Maximum number of items in the merged feed')
+    parser.add_argument('--source', choices=[source['name'] for source in SOURCES],
+                        help='Only merge in this rebuilt source, keeping the other items of the current merged feed')
+    parser.add_argument('--base-url', default=os.environ.get('FEED_BASE_URL', ''),
+                        help='Public URL the feeds are published under (defaults to $FEED_BASE_URL)')
+    args = parser.parse_args()
+
+    generator = AllSourcesRSSGenerator(base_url=args.base_url, window=args.window)
+    rss_feed = generator.generate_feed(args.source)
+    generator.save_rss_feed(rss_feed)
+    generator.save_rss_feed(generator.create_opml(), generator.opml_filename)
+    print("\nMerged RSS feed generated successfully!")
@@ -0,0 +1,377 @@
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urlunsplit
+import argparse
+import fcntl
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+# Helpers used by more than one generator. The generators are run as standalone scripts
+# from their own directory and put this directory on sys.path before importing it.
+
+
+def canonical_url(url):
+    """Normalise a URL for use as an item identity (lower-case host, no fragment or trailing slash)."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/') or '/', parts.query, ''))
+
+
+def content_digest(*parts):
+    """Return a stable hex digest of the given item fields (unlike hash(), it survives restarts)."""
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class ItemTracker:
+    """Stable item GUIDs and content fingerprints, persisted between runs.
+
+    Items are keyed by their identity (canonical link or content digest), but new items are
+    published with the GUID the feed used before tracking existed, normally the link as it
+    appears on the site. When an item's fingerprint changes it gets a revision GUID so
+    readers pick up the edit once; unchanged items keep the GUID they were published with,
+    so the feed does not churn.
+    """
+
+    # Forget items that have not been seen for this long
+    MAX_AGE_DAYS = 90
+
+    def __init__(self, path):
+        self.path = path
+        self.items = {}
+        self.last_build = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.items = state.get('items', {})
+            self.last_build = state.get('lastBuild')
+
+    def track(self, identity, fingerprint, guid=None):
+        """Return (guid, status) for an item, where status is 'new', 'changed' or 'unchanged'"""
+        now = datetime.now().isoformat()
+        known = self.items.get(identity)
+        if known is None:
+            guid, status = guid or identity, 'new'
+        elif known['fingerprint'] != fingerprint:
+            guid, status = f"{guid or identity}#rev-{fingerprint[:12]}", 'changed'
+        else:
+            known['seen'] = now
+            return known['guid'], 'unchanged'
+        self.items[identity] = {'guid': guid, 'fingerprint': fingerprint, 'seen': now}
+        return guid, status
+
+    def keep(self, identity, guid=None):
+        """Return (guid, status) for an item whose content could not be read this run.
+
+        Its stored fingerprint is left alone, so a temporary fetch failure is not reported
+        as an edit, and again when the fetch recovers.
+        """
+        known = self.items.get(identity)
+        if known is None:
+            return guid or identity, 'new'
+        known['seen'] = datetime.now().isoformat()
+        return known['guid'], 'unchanged'
+
+    def build_date(self, changed):
+        """Keep the previous lastBuildDate unless items were added or changed, so unchanged feeds stay identical"""
+        if changed or not self.last_build:
+            self.last_build = datetime.now().isoformat()
+        return datetime.fromisoformat(self.last_build)
+
+    def save(self):
+        cutoff = datetime.now().timestamp() - self.MAX_AGE_DAYS * 86400
+        items = {k: v for k, v in self.items.items() if datetime.fromisoformat(v['seen']).timestamp() >= cutoff}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'lastBuild': self.last_build, 'items': items}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def slugify(text):
+    """Turn a category or tag into a file-name friendly slug.
+
+    Text without any ASCII letters or digits gets a short digest instead, so it still has a
+    usable, stable slug.
+    """
+    slug = re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+    if not slug and text.strip():
+        slug = hashlib.sha1(text.strip().encode('utf-8')).hexdigest()[:10]
+    return slug
+
+
+def parse_filter(expression):
+    """Parse a filter expression like 'navigation map -beta' into (include, exclude) slug sets.
+
+    An item matches when it has any of the included categories (or no includes are given)
+    and none of the excluded ones.
+    """
+    include, exclude = set(), set()
+    for term in expression.replace(',', ' ').split():
+        (exclude if term.startswith('-') else include).add(slugify(term.lstrip('+-')))
+    return include, exclude
+
+
+def matches_filter(categories, item_filter):
+    """Check a list of categories against a parsed filter expression"""
+    include, exclude = item_filter
+    slugs = {slugify(category) for category in categories}
+    return (not include or bool(slugs & include)) and not (slugs & exclude)
+
+
+def add_to_partition(partitions, filename, title_suffix, item):
+    """Add an item to a partition once, even if several of its categories or tags map to the same feed.
+
+    partitions maps a feed filename to (title suffix, items).
+    """
+    items = partitions.setdefault(filename, (title_suffix, []))[1]
+    if not items or items[-1] is not item:
+        items.append(item)
+
+
+def derive_option(value):
+    """argparse type for --derive NAME=EXPR; returns (name, parsed filter)"""
+    name, separator, expression = value.partition('=')
+    if not separator or not name.strip() or not expression.strip():
+        raise argparse.ArgumentTypeError(f"expected NAME=EXPR, got '{value}'")
+    return name.strip(), parse_filter(expression)
+
+
+class NewsItemStreamParser(HTMLParser):
+    """Incremental parser that collects news item <article> markup from a streamed listing page.
+
+    Parsing is done once `limit` news_item articles have been collected, wherever they sit
+    in the page; with fewer items the whole page is read. Articles that only have a
+    'news'-like class are kept as a fallback, mirroring the alternative selector in
+    the Sparta generators' fetch_articles.
+    """
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=False)
+        self.limit = limit
+        self.news_items = []
+        self.fallback_items = []
+        self.done = False
+        self.current = None
+        self.current_list = None
+        self.article_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.current is not None:
+            self.current.append(self.get_starttag_text())
+            if tag == 'article':
+                self.article_depth += 1
+        elif tag == 'article' and not self.done:
+            classes = dict(attrs).get('class') or ''
+            if 'news_item' in classes.split():
+                self.current_list = self.news_items
+            elif 'news' in classes.lower() and len(self.fallback_items) < self.limit:
+                self.current_list = self.fallback_items
+            if self.current_list is not None:
+                self.current = [self.get_starttag_text()]
+                self.article_depth = 1
+
+    def handle_startendtag(self, tag, attrs):
+        if self.current is not None:
+            self.current.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if self.current is not None:
+            self.current.append(f'</{tag}>')
+            if tag == 'article':
+                self.article_depth -= 1
+                if self.article_depth == 0:
+                    self.current_list.append(''.join(self.current))
+                    self.current = None
+                    self.current_list = None
+                    if len(self.news_items) >= self.limit:
+                        self.done = True
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.current.append(data)
+
+    def handle_entityref(self, name):
+        if self.current is not None:
+            self.current.append(f'&{name};')
+
+    def handle_charref(self, name):
+        if self.current is not None:
+            self.current.append(f'&#{name};')
+
+
+def current_run_id():
+    """Identify the current run: $FEED_RUN_ID (set by the job runner), else the GitHub Actions run, else None"""
+    if os.environ.get('FEED_RUN_ID'):
+        return os.environ['FEED_RUN_ID']
+    if os.environ.get('GITHUB_RUN_ID'):
+        return f"{os.environ['GITHUB_RUN_ID']}-{os.environ.get('GITHUB_RUN_ATTEMPT', '1')}"
+    return None
+
+
+class ArticleDetailCache:
+    """On-disk cache of parsed article pages, shared by the Sparta main and Kidsclub generators.
+
+    Entries live in a directory per run id, so a page is fetched once per run and an edit
+    is always picked up by the next run. Directories of earlier runs are removed once they
+    are STALE_RUN_HOURS old (younger ones may belong to a run that is still going). Entries
+    are keyed by canonical_url of the article. Each key is guarded by a thread lock and an
+    flock'ed lock file, so concurrent requests for the same article, in this process or the
+    other generator, wait for a single fetch instead of repeating it.
+    """
+
+    STALE_RUN_HOURS = 12
+
+    def __init__(self, cache_root, run_id):
+        self.cache_dir = os.path.join(cache_root, slugify(run_id))
+        self.locks = {}
+        self.locks_guard = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.remove_stale_runs(cache_root)
+
+    def remove_stale_runs(self, cache_root):
+        cutoff = time.time() - self.STALE_RUN_HOURS * 3600
+        for entry in os.scandir(cache_root):
+            if entry.is_dir() and entry.path != self.cache_dir and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def key_lock(self, key):
+        with self.locks_guard:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def read(self, path):
+        """Return (published_date, main_html_content) from a cache entry, or None"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            return datetime.fromisoformat(entry['pubDate']), entry['body']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def get_or_fetch(self, url, fetch):
+        """Return the cached details for url, calling fetch(url) at most once across waiting callers"""
+        key = hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()
+        path = os.path.join(self.cache_dir, f'{key}.json')
+        with self.key_lock(key), open(os.path.join(self.cache_dir, f'{key}.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            cached = self.read(path)
+            if cached is not None:
+                return cached
+
+            pub_date, body_html = fetch(url)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'pubDate': pub_date.isoformat(), 'body': body_html}, f)
+            os.replace(tmp_path, path)
+            return pub_date, body_html
+
+
+def cassette_key(request):
+    """Return the cassette file key for a prepared request (method, URL and body)."""
+    digest = hashlib.sha1(f"{request.method} {request.url}".encode('utf-8'))
+    if request.body:
+        body = request.body if isinstance(request.body, bytes) else str(request.body).encode('utf-8')
+        digest.update(body)
+    return digest.hexdigest()
+
+
+class CassetteRecordAdapter(BaseAdapter):
+    """Transport adapter that sends requests through the original adapter and records every exchange."""
+
+    # The recorded body is already decoded, so these no longer describe it
+    SKIP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+    # Cloudflare clearance and other session cookies must not end up in a cassette
+    SECRET_HEADERS = ('set-cookie', 'set-cookie2')
+
+    def __init__(self, inner, cassette_dir):
+        super().__init__()
+        self.inner = inner
+        self.cassette_dir = cassette_dir
+        os.makedirs(cassette_dir, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        response = self.inner.send(request, **kwargs)
+        key = cassette_key(request)
+        # Request headers are not stored: replay never needs them and they carry the session cookies
+        entry = {
+            'request': {
+                'method': request.method,
+                'url': request.url,
+            },
+            'response': {
+                'status': response.status_code,
+                'reason': response.reason,
+                'url': response.url,
+                'headers': {k: v for k, v in response.headers.items() if k.lower() not in self.SKIP_HEADERS + self.SECRET_HEADERS},
+            },
+        }
+        with open(os.path.join(self.cassette_dir, f'{key}.json'), 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent=1)
+        with gzip.open(os.path.join(self.cassette_dir, f'{key}.body.gz'), 'wb') as f:
+            f.write(response.content)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+class CassetteReplayAdapter(BaseAdapter):
+    """Transport adapter that serves recorded responses from a cassette directory without network access."""
+
+    def __init__(self, cassette_dir):
+        super().__init__()
+        self.cassette_dir = cassette_dir
+        # Entries are kept in memory after the first read so replay loops never touch the disk again
+        self.entries = {}
+
+    def load(self, key):
+        """Return (response metadata, body) for a cassette key, or None if it was never recorded."""
+        if key not in self.entries:
+            meta_path = os.path.join(self.cassette_dir, f'{key}.json')
+            if not os.path.exists(meta_path):
+                return None
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)['response']
+            with gzip.open(os.path.join(self.cassette_dir, f'{key}.body.gz'), 'rb') as f:
+                body = f.read()
+            self.entries[key] = (meta, body)
+        return self.entries[key]
+
+    def send(self, request, **kwargs):
+        entry = self.load(cassette_key(request))
+        if entry is None:
+            raise requests.ConnectionError(f"No recorded response for {request.method} {request.url}", request=request)
+
+        meta, body = entry
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.reason = meta['reason']
+        response.url = meta['url']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def mount_cassette(session, record_dir=None, replay_dir=None):
+    """Record all HTTP traffic of a session to, or replay it from, a cassette directory."""
+    if replay_dir:
+        adapter = CassetteReplayAdapter(replay_dir)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    elif record_dir:
+        for prefix in ('https://', 'http://'):
+            session.mount(prefix, CassetteRecordAdapter(session.get_adapter(prefix), record_dir))
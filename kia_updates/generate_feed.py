@@ -3,9 +3,71 @@ from bs4 import BeautifulSoup
 from datetime import datetime
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
+from html.parser import HTMLParser
+import argparse
+import codecs
+import os
+import sys
 import re
 from urllib.parse import urljoin
 
+# Helpers shared with the other generators
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from feed_common import add_to_partition, canonical_url, content_digest, derive_option, ItemTracker, matches_filter, mount_cassette, slugify
+
+ET.register_namespace('atom', 'http://www.w3.org/2005/Atom')
+
+
+class TableStreamParser(HTMLParser):
+    """Incremental parser that collects the markup of the first <table> in a streamed page.
+
+    Parsing is done as soon as that table closes, so the rest of the page is never downloaded.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self.table_depth = 0
+        self.done = False
+
+    @property
+    def table_html(self):
+        return ''.join(self.parts)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            self.table_depth += 1
+        if self.table_depth:
+            self.parts.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        if self.table_depth and not self.done:
+            self.parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if not self.table_depth or self.done:
+            return
+        self.parts.append(f'</{tag}>')
+        if tag == 'table':
+            self.table_depth -= 1
+            if self.table_depth == 0:
+                self.done = True
+
+    def handle_data(self, data):
+        if self.table_depth and not self.done:
+            self.parts.append(data)
+
+    def handle_entityref(self, name):
+        if self.table_depth and not self.done:
+            self.parts.append(f'&{name};')
+
+    def handle_charref(self, name):
+        if self.table_depth and not self.done:
+            self.parts.append(f'&#{name};')
+
+
 class KiaUpdateRSSGenerator:
     def __init__(self):
         self.base_url = "https://update.kia.com"
@@ -14,18 +76,44 @@ class KiaUpdateRSSGenerator:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept-Language': 'nl-NL,nl;q=0.9,en;q=0.8'
         }
+        self.session = requests.Session()
+        self.state_file = '.feed_state.json'
+        self.last_build_date = None
+        # WebSub: where the feed is published and which hub to advertise; websub_hub/ping_hub.py
+        # notifies the hub once the feeds are deployed
+        self.feed_base_url = os.environ.get('FEED_BASE_URL', '').rstrip('/')
+        self.hub_url = os.environ.get('WEBSUB_HUB_URL', '')
+        self.feed_filename = 'kia_updates.xml'
+        # Extra feeds on top of the per-category ones: name -> parsed filter expression
+        self.derived_filters = {}
+        self.derived_feeds = {}
+
+    def use_cassette(self, record_dir=None, replay_dir=None):
+        """Record all HTTP traffic to, or replay it from, a cassette directory."""
+        mount_cassette(self.session, record_dir=record_dir, replay_dir=replay_dir)
 
     def fetch_updates(self, page=1):
-        """Fetch the update notices from Kia website"""
+        """Fetch the update notices table from Kia website; '' if the page has no table, None on request errors"""
         try:
             # Add page parameter if needed
             url = self.updates_url
             if page > 1:
                 url = f"{url}?page={page}"
 
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.text
+            # Stream the page and stop downloading once the notices table has closed
+            with self.session.get(url, headers=self.headers, stream=True) as response:
+                response.raise_for_status()
+                parser = TableStreamParser()
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                for chunk in response.iter_content(chunk_size=16384):
+                    parser.feed(decoder.decode(chunk))
+                    if parser.done:
+                        break
+                else:
+                    parser.feed(decoder.decode(b'', final=True))
+                    parser.close()
+
+            return parser.table_html
         except requests.RequestException as e:
             print(f"Error fetching updates: {e}")
             return None
@@ -79,6 +167,7 @@ class KiaUpdateRSSGenerator:
             # Cell 3: Date
             date_text = cells[3].get_text(strip=True)
             update['date'] = self.parse_date(date_text)
+            update['date_text'] = date_text
 
             # Cell 4: Views (if exists)
             if len(cells) >= 5:
@@ -131,19 +220,63 @@ class KiaUpdateRSSGenerator:
         print(f"Could not parse date: {date_str}")
         return datetime.now()
 
-    def create_rss_feed(self, updates):
+    def track_items(self, updates):
+        """Assign stable GUIDs and report which updates are new or changed since the last run"""
+        tracker = ItemTracker(self.state_file)
+        statuses = []
+        for update in updates:
+            guid = None
+            if update['link'] != self.updates_url:
+                identity, guid = canonical_url(update['link']), update['link']
+            else:
+                # Rows without their own page are identified by their content
+                identity = f"urn:sha256:{content_digest(update.get('category', ''), update['title'], update['date_text'])}"
+            # Views are left out on purpose: they change on every run. The date is used as shown
+            # on the site, since an unparseable one falls back to the current time.
+            fingerprint = content_digest(update['title'], update.get('category', ''), update['date_text'])
+            update['guid'], status = tracker.track(identity, fingerprint, guid)
+            statuses.append(status)
+
+        new, changed = statuses.count('new'), statuses.count('changed')
+        self.last_build_date = tracker.build_date(new or changed)
+        tracker.save()
+        print(f"{new} new, {changed} changed, {len(updates) - new - changed} unchanged")
+
+    def partition_updates(self, updates):
+        """Split updates into per-category and filtered feeds in a single pass.
+
+        Returns a dict of filename -> (title suffix, updates). Filtered feeds are named
+        kia_updates_filter-<name>.xml, so they never collide with a category feed.
+        """
+        partitions = {}
+        for update in updates:
+            categories = [update['category']] if update.get('category') else []
+            for category in categories:
+                add_to_partition(partitions, f"kia_updates-{slugify(category)}.xml", category, update)
+            for name, item_filter in self.derived_filters.items():
+                if matches_filter(categories, item_filter):
+                    add_to_partition(partitions, f"kia_updates_filter-{slugify(name)}.xml", name, update)
+        return partitions
+
+    def create_rss_feed(self, updates, title_suffix=None, filename=None):
         """Create RSS feed from updates"""
         rss = ET.Element('rss', version='2.0')
         channel = ET.SubElement(rss, 'channel')
 
         # Add channel metadata
-        ET.SubElement(channel, 'title').text = 'Kia Navigation Updates - Netherlands'
+        title = 'Kia Navigation Updates - Netherlands'
+        ET.SubElement(channel, 'title').text = f"{title} ({title_suffix})" if title_suffix else title
         ET.SubElement(channel, 'link').text = self.updates_url
         ET.SubElement(channel, 'description').text = 'Laatste navigatie-updates en meldingen van Kia Nederland'
         ET.SubElement(channel, 'language').text = 'nl-NL'
-        ET.SubElement(channel, 'lastBuildDate').text = datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')
+        ET.SubElement(channel, 'lastBuildDate').text = (self.last_build_date or datetime.now()).strftime('%a, %d %b %Y %H:%M:%S +0000')
         ET.SubElement(channel, 'generator').text = 'Kia Update RSS Generator'
 
+        # Advertise the WebSub hub so readers can subscribe instead of polling
+        if self.hub_url and self.feed_url(filename):
+            ET.SubElement(channel, '{http://www.w3.org/2005/Atom}link', href=self.feed_url(filename), rel='self', type='application/rss+xml')
+            ET.SubElement(channel, '{http://www.w3.org/2005/Atom}link', href=self.hub_url, rel='hub')
+
         # Add items
         for update in updates:
             item = ET.SubElement(channel, 'item')
@@ -151,7 +284,8 @@ class KiaUpdateRSSGenerator:
             ET.SubElement(item, 'link').text = update.get('link', self.updates_url)
             ET.SubElement(item, 'description').text = update.get('description', '')
             ET.SubElement(item, 'pubDate').text = update.get('date', datetime.now()).strftime('%a, %d %b %Y %H:%M:%S +0000')
-            ET.SubElement(item, 'guid', isPermaLink='true').text = update.get('link', f"{self.updates_url}#{hash(update.get('title', ''))}")
+            guid = update.get('guid', update.get('link', self.updates_url))
+            ET.SubElement(item, 'guid', isPermaLink='true' if guid == update.get('link') else 'false').text = guid
 
             # Add category if available
             if update.get('category'):
@@ -162,8 +296,20 @@ class KiaUpdateRSSGenerator:
         dom = minidom.parseString(xml_str)
         return dom.toprettyxml(indent='  ')
 
-    def save_rss_feed(self, rss_content, filename='kia_updates.xml'):
-        """Save RSS feed to file"""
+    def feed_url(self, filename=None):
+        """Public URL of a feed file written by this generator, or None if FEED_BASE_URL is not set"""
+        if not self.feed_base_url:
+            return None
+        return f"{self.feed_base_url}/kia_updates/{filename or self.feed_filename}"
+
+    def save_rss_feed(self, rss_content, filename=None):
+        """Save RSS feed to file, leaving it untouched when the content did not change"""
+        filename = filename or self.feed_filename
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as f:
+                if f.read() == rss_content:
+                    print(f"RSS feed {filename} is unchanged")
+                    return
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(rss_content)
         print(f"RSS feed saved to {filename}")
@@ -173,7 +319,8 @@ class KiaUpdateRSSGenerator:
         print("Fetching Kia updates...")
         html_content = self.fetch_updates()
 
-        if not html_content:
+        # None means the request failed; a page without the table yields '' and is reported by parse_updates
+        if html_content is None:
             print("Failed to fetch updates")
             return None
 
@@ -187,19 +334,39 @@ class KiaUpdateRSSGenerator:
         print(f"Found {len(updates)} updates:")
         for update in updates:
             print(f"  - {update['title']} ({update['date'].strftime('%d-%b-%Y')})")
+        self.track_items(updates)
 
         print("\nCreating RSS feed...")
         rss_feed = self.create_rss_feed(updates)
 
+        self.derived_feeds = {}
+        for filename, (title_suffix, partition) in self.partition_updates(updates).items():
+            self.derived_feeds[filename] = self.create_rss_feed(partition, title_suffix, filename)
+        print(f"Created {len(self.derived_feeds)} category feeds")
+
         return rss_feed
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate the Kia navigation updates RSS feed')
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='DIR', help='Record all HTTP requests and responses to a cassette directory')
+    cassette.add_argument('--replay', metavar='DIR', help='Serve HTTP responses from a cassette directory without network access')
+    parser.add_argument('--state', default='.feed_state.json', help='File with item GUIDs and fingerprints kept between runs')
+    parser.add_argument('--derive', action='append', default=[], metavar='NAME=EXPR', type=derive_option,
+                        help="Extra feed of items whose categories match EXPR, e.g. 'maps=navigation map -software'")
+    args = parser.parse_args()
+
     # Generate RSS feed
     generator = KiaUpdateRSSGenerator()
+    generator.state_file = args.state
+    generator.derived_filters = dict(args.derive)
+    generator.use_cassette(record_dir=args.record, replay_dir=args.replay)
     rss_feed = generator.generate_feed()
 
     if rss_feed:
         generator.save_rss_feed(rss_feed)
+        for filename, derived_feed in generator.derived_feeds.items():
+            generator.save_rss_feed(derived_feed, filename)
         print("\nRSS feed generated successfully!")
 
@@ -0,0 +1,404 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Helpers shared with the generators
+sys.path.insert(0, os.path.join(REPO_ROOT, 'common'))
+from feed_common import ArticleDetailCache
+
+# Generator module and class driven for each kind of synthetic source
+GENERATORS = {
+    'sparta': ('sparta_main', 'SpartaRotterdamRSSGenerator'),
+    'kia': ('kia_updates', 'KiaUpdateRSSGenerator'),
+    'ui': ('ui_blog', 'UIBlogRSSGenerator'),
+}
+
+DUTCH_MONTHS = ['januari', 'februari', 'maart', 'april', 'mei', 'juni', 'juli',
+                'augustus', 'september', 'oktober', 'november', 'december']
+
+# Ways a listing page can wrap its news items: (markup before each item, markup after it)
+SPARTA_LAYOUTS = {
+    'flat': ('', ''),
+    'list': ('<li>', '</li>'),
+    'columns': ('<div class="col"><div class="card">', '</div></div>'),
+}
+
+
+def sparta_listing(source, items, layout, padding=''):
+    """Build a Sparta-style listing page with the news items wrapped according to layout"""
+    before, after = SPARTA_LAYOUTS[layout]
+    articles = ''.join(
+        f'{before}<article class="news_item" style="background-image: url(/img/{source}-{i}.jpg)">'
+        f'<a class="item_link" href="nieuws/{i}"></a>'
+        f'<span class="item_label">Nieuws</span><h3>Bericht {i} van bron {source}</h3></article>{after}'
+        for i in range(items)
+    )
+    if layout == 'list':
+        articles = f'<ul>{articles}</ul>'
+    return f'<html><body><section class="news">{articles}</section><footer>{padding}</footer></body></html>'
+
+
+class SyntheticSiteHandler(BaseHTTPRequestHandler):
+    """Serves Sparta-style listing/article pages, Kia-style tables and UI-blog-style JSON.
+
+    Every path starts with /s/<source>/<kind>/ so each source instance gets its own URLs.
+    Latency, error rate, page sizes and the Sparta listing layout come from the class-level
+    config; with the 'mixed' layout each source gets one of SPARTA_LAYOUTS.
+    """
+
+    config = {}
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        config = self.config
+        time.sleep(max(0.0, random.gauss(config['latency'], config['jitter'])))
+        if random.random() < config['error_rate']:
+            self.respond(503, 'text/plain', b'Service unavailable')
+            return
+
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) < 3 or parts[0] != 's':
+            self.respond(404, 'text/plain', b'Not found')
+            return
+        source, kind, rest = parts[1], parts[2], parts[3:]
+        rng = random.Random(self.path)
+
+        if kind == 'sparta' and not rest:
+            body = self.sparta_listing(source, parse_qs(url.query).get('layout', [config['sparta_layout']])[0])
+        elif kind == 'sparta' and rest[0] == 'nieuws':
+            body = self.sparta_article(rng)
+        elif kind == 'kia':
+            body = self.kia_table(source, rng)
+        elif kind == 'ui':
+            self.respond(200, 'application/json', self.ui_articles(source, rng).encode('utf-8'))
+            return
+        else:
+            self.respond(404, 'text/plain', b'Not found')
+            return
+        self.respond(200, 'text/html; charset=utf-8', body.encode('utf-8'))
+
+    def respond(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def padding(self):
+        return '<p>' + 'Lorem ipsum dolor sit amet. ' * (self.config['page_kb'] * 1024 // 28) + '</p>'
+
+    def sparta_listing(self, source, layout):
+        if layout == 'mixed':
+            layouts = sorted(SPARTA_LAYOUTS)
+            layout = layouts[zlib.crc32(source.encode('utf-8')) % len(layouts)]
+        return sparta_listing(source, self.config['items'], layout, self.padding())
+
+    def sparta_article(self, rng):
+        month = rng.choice(DUTCH_MONTHS)
+        return (f'<html><body><article class="single"><span class="datetime">{rng.randint(1, 28)} {month} 2025 - 17:00</span>'
+                f'<p>Artikeltekst.</p>{self.padding()}<img src="/img/x.jpg"></article></body></html>')
+
+    def kia_table(self, source, rng):
+        rows = ''.join(
+            f'<tr><td></td><td>{rng.choice(["Navigation", "Map", "Software"])}</td>'
+            f'<td><a href="/s/{source}/kia/notice/{i}">Update {i}</a></td>'
+            f'<td>{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}-2025</td><td>{rng.randint(1, 9999)}</td></tr>'
+            for i in range(self.config['items'])
+        )
+        header = '<tr><th></th><th>Category</th><th>Title</th><th>Date</th><th>Views</th></tr>'
+        return f'<html><body><table>{header}{rows}</table>{self.padding()}</body></html>'
+
+    def ui_articles(self, source, rng):
+        return json.dumps({'data': [{
+            'title': f'Post {i} from {source}',
+            'slug': f'{source}-post-{i}',
+            'description': 'Lorem ipsum ' * (self.config['page_kb'] * 1024 // 12 // max(1, self.config['items'])),
+            'createdAt': f'2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00.000Z',
+            'cover': {'url': f'/img/{source}-{i}.jpg'},
+            'author': {'name': 'Load Test'},
+            'tags': [{'name': rng.choice(['UniFi', 'Protect', 'Network'])}],
+        } for i in range(self.config['items'])]})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SyntheticSiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Streamed listings stop reading early and reset the connection; that is expected
+        pass
+
+
+def serve(port, config, ready):
+    """Run the synthetic site; started in its own process so it does not skew the measurements"""
+    SyntheticSiteHandler.config = config
+    server = SyntheticSiteServer(('127.0.0.1', port), SyntheticSiteHandler)
+    ready.set()
+    server.serve_forever()
+
+
+def load_generator_class(kind):
+    """Import a generator module from its directory"""
+    directory, class_name = GENERATORS[kind]
+    path = os.path.join(REPO_ROOT, directory, 'generate_feed.py')
+    spec = importlib.util.spec_from_file_location(f'{directory}_generate_feed', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+
+def check_sparta_layouts(generator_class, items):
+    """Feed every listing layout through the streaming parser in small chunks.
+
+    Returns layout -> (items found, items expected); the parser must find the same items
+    as a full-page select would, however the items are wrapped.
+    """
+    module = sys.modules[generator_class.__module__]
+    limit = generator_class().max_articles
+    results = {}
+    for layout in SPARTA_LAYOUTS:
+        page = sparta_listing('check', items, layout)
+        parser = module.NewsItemStreamParser(limit)
+        for start in range(0, len(page), 64):
+            parser.feed(page[start:start + 64])
+            if parser.done:
+                break
+        parser.close()
+        results[layout] = (len(parser.news_items), min(items, limit))
+    return results
+
+
+def make_generator(generator_class, kind, source, base_url, work_dir, detail_cache=None):
+    """Create a generator instance pointed at the synthetic site; Sparta sources share detail_cache"""
+    generator = generator_class()
+    prefix = f'{base_url}/s/{source}/{kind}'
+    if kind == 'sparta':
+        generator.base_url = prefix
+        generator.site_url = f'{prefix}/'
+        generator.request_delay = 0
+        generator.detail_cache = detail_cache
+    elif kind == 'kia':
+        generator.base_url = prefix
+        generator.updates_url = f'{prefix}/EU/NL/updateNoticeList'
+    else:
+        generator.base_url = prefix
+        generator.api_url = f'{prefix}/api/articles'
+    generator.state_file = os.path.join(work_dir, f'{source}.state.json')
+    generator.hub_url = ''
+    return generator
+
+
+class ResourceSampler:
+    """Samples resident memory and open file descriptors of this process in the background"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_fds = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    self.peak_rss_mb = max(self.peak_rss_mb, int(line.split()[1]) / 1024)
+        self.peak_fds = max(self.peak_fds, len(os.listdir('/proc/self/fd')))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+
+
+class ThreadOutput(io.TextIOBase):
+    """Stand-in for stdout that keeps what each worker thread printed, so failed sources can be explained"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def write(self, text):
+        if not hasattr(self.local, 'parts'):
+            self.local.parts = []
+        self.local.parts.append(text)
+        return len(text)
+
+    def take(self):
+        """Return and forget what the current thread printed"""
+        text = ''.join(getattr(self.local, 'parts', []))
+        self.local.parts = []
+        return text
+
+
+def failure_reason(output):
+    """Summarise why a generator returned no feed from what it printed, without per-source URLs"""
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    errors = [line for line in lines if 'error' in line.lower() or 'failed' in line.lower()]
+    line = (errors or lines or ['no output'])[-1]
+    return re.sub(r'\S+://\S+', '<url>', line)[:120]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_level(sources, concurrency, work_dir):
+    """Run every source once at the given concurrency and return the measurements"""
+    latencies = []
+    # kind -> reason -> count; exceptions are reported by type, empty results by the error they printed
+    failures = {}
+    lock = threading.Lock()
+    output = ThreadOutput()
+
+    def run_source(generator, kind, source):
+        output.take()
+        start = time.perf_counter()
+        try:
+            rss_feed = generator.generate_feed()
+            if rss_feed:
+                generator.save_rss_feed(rss_feed, os.path.join(work_dir, f'{source}.xml'))
+            reason = None if rss_feed else failure_reason(output.take())
+        except Exception as e:
+            reason = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if reason:
+                reasons = failures.setdefault(kind, {})
+                reasons[reason] = reasons.get(reason, 0) + 1
+
+    with ResourceSampler() as sampler, contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for generator, kind, source in sources:
+                pool.submit(run_source, generator, kind, source)
+        wall = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'sources': len(sources),
+        'failed': sum(count for reasons in failures.values() for count in reasons.values()),
+        'failures': failures,
+        'feeds_per_min': round(len(sources) / wall * 60, 1),
+        'p50_s': round(percentile(latencies, 50), 3),
+        'p99_s': round(percentile(latencies, 99), 3),
+        'peak_rss_mb': round(sampler.peak_rss_mb, 1),
+        'peak_fds': sampler.peak_fds,
+    }
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Drive many synthetic sources through the feed generators')
+    parser.add_argument('--sources', type=int, default=300, help='Number of source instances (split over Sparta, Kia and UI blog)')
+    parser.add_argument('--concurrency', default='1,8,32,64', help='Comma separated concurrency levels to measure')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Mean response latency of the synthetic site')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='Standard deviation of the response latency')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='Fraction of requests answered with 503')
+    parser.add_argument('--items', type=int, default=20, help='Items per listing page, table or API response')
+    parser.add_argument('--page-kb', type=int, default=30, help='Approximate size of each page in KiB')
+    parser.add_argument('--sparta-layout', choices=['mixed'] + list(SPARTA_LAYOUTS), default='mixed',
+                        help='How Sparta listing pages wrap their news items')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the synthetic site')
+    parser.add_argument('--json', metavar='FILE', help='Also write the report to a JSON file')
+    parser.add_argument('--no-detail-cache', action='store_true',
+                        help='Fetch Sparta article pages directly instead of through the shared on-disk cache')
+    parser.add_argument('--check-layouts', action='store_true',
+                        help='Only check that the Sparta listing parser finds every item in each layout, then exit')
+    args = parser.parse_args()
+
+    if args.check_layouts:
+        # Standalone fixture check, separate from the measurements: every listing layout must
+        # yield the same items through the streaming parser
+        sparta_class = load_generator_class('sparta')
+        mismatches = [
+            f"found {found} of {expected} items in the '{layout}' layout"
+            for items in (3, args.items)
+            for layout, (found, expected) in check_sparta_layouts(sparta_class, items).items()
+            if found != expected
+        ]
+        if mismatches:
+            sys.exit('Sparta listing parser ' + '; '.join(mismatches))
+        print(f"Sparta listing layouts parsed correctly: {', '.join(SPARTA_LAYOUTS)}")
+        sys.exit(0)
+
+    config = {
+        'latency': args.latency_ms / 1000,
+        'jitter': args.jitter_ms / 1000,
+        'error_rate': args.error_rate,
+        'items': args.items,
+        'page_kb': args.page_kb,
+        'sparta_layout': args.sparta_layout,
+    }
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args.port, config, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    # Leave room for one socket per concurrent request
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    classes = {kind: load_generator_class(kind) for kind in GENERATORS}
+    kinds = list(GENERATORS)
+    report = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for concurrency in [int(level) for level in args.concurrency.split(',')]:
+            # Like a real run, every level starts with an empty cache of its own
+            detail_cache = None
+            if not args.no_detail_cache:
+                detail_cache = ArticleDetailCache(os.path.join(work_dir, 'detail_cache'), f'concurrency-{concurrency}')
+            sources = []
+            for i in range(args.sources):
+                kind = kinds[i % len(kinds)]
+                source = f'{kind}{i}'
+                generator = make_generator(classes[kind], kind, source, base_url, work_dir, detail_cache)
+                sources.append((generator, kind, source))
+            result = run_level(sources, concurrency, work_dir)
+            report.append(result)
+            print(f"concurrency {result['concurrency']:>4}: {result['feeds_per_min']:>8} feeds/min, "
+                  f"p50 {result['p50_s']:.3f}s, p99 {result['p99_s']:.3f}s, "
+                  f"peak RSS {result['peak_rss_mb']} MB, peak fds {result['peak_fds']}, "
+                  f"failed {result['failed']}/{result['sources']}")
+            for kind, reasons in sorted(result['failures'].items()):
+                for reason, count in sorted(reasons.items(), key=lambda entry: -entry[1]):
+                    print(f"    {kind}: {count} x {reason}")
+
+    server.terminate()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
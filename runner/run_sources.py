@@ -0,0 +1,462 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+import argparse
+import hmac
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+# Every generator lives in its own directory and is run from there, exactly like the workflow does
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SOURCES = [
+    {'name': 'sparta_main', 'directory': 'sparta_main', 'host': 'www.sparta-rotterdam.nl'},
+    {'name': 'sparta_kids', 'directory': 'sparta_kids', 'host': 'www.sparta-rotterdam.nl'},
+    {'name': 'kia_updates', 'directory': 'kia_updates', 'host': 'update.kia.com'},
+    {'name': 'ui_blog', 'directory': 'ui_blog', 'host': 'blog.ui.com'},
+]
+
+
+class JobQueue:
+    """SQLite-backed job queue with leases, heartbeats and per-host concurrency limits.
+
+    All state lives in the database file, so any number of worker processes on this
+    machine can pull from the same queue. Claims run in an IMMEDIATE transaction, which
+    makes the per-host limit hold across all workers. The database uses WAL mode, which
+    needs shared memory between the processes: keep it on a local disk, never on a
+    network filesystem. Workers on other machines go through the coordinator's HTTP API
+    (RemoteJobQueue) instead of opening the database.
+    """
+
+    def __init__(self, path, lease_seconds=120, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # The coordinator's HTTP server shares one connection between its threads, guarded by a lock
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                host TEXT NOT NULL,
+                args TEXT NOT NULL DEFAULT '[]',
+                run_id TEXT NOT NULL DEFAULT '',
+                state TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                updated REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, host);
+            CREATE TABLE IF NOT EXISTS host_limits (
+                host TEXT PRIMARY KEY,
+                max_concurrency INTEGER NOT NULL
+            );
+        ''')
+        # Queues created before jobs had a run id
+        if 'run_id' not in [row['name'] for row in self.conn.execute('PRAGMA table_info(jobs)')]:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN run_id TEXT NOT NULL DEFAULT ''")
+
+    def reopen(self):
+        """Return a new queue on the same database, for use from another thread"""
+        return JobQueue(self.path, self.lease_seconds, self.max_attempts)
+
+    def close(self):
+        self.conn.close()
+
+    def set_host_limit(self, host, max_concurrency):
+        """Limit how many jobs for a host may hold a lease at the same time."""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO host_limits (host, max_concurrency) VALUES (?, ?)',
+            (host, max_concurrency)
+        )
+
+    def enqueue(self, sources, run_id=''):
+        """Add one job per source; the generators of one run share run_id (passed on as $FEED_RUN_ID)"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            for source in sources:
+                self.conn.execute(
+                    'INSERT INTO jobs (name, directory, host, args, run_id, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                    (source['name'], source['directory'], source['host'], json.dumps(source.get('args', [])), run_id, now)
+                )
+        return len(sources)
+
+    def claim(self, worker_id, default_host_limit=1):
+        """Lease the next runnable job to worker_id, or return None if nothing can run right now."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+
+            # Leases that were not renewed in time belong to dead or stuck workers: retry or give up
+            self.conn.execute(
+                '''UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                       lease_owner = NULL, last_error = 'lease expired', updated = ?
+                   WHERE state = 'leased' AND lease_expires < ?''',
+                (self.max_attempts, now, now)
+            )
+
+            row = self.conn.execute(
+                '''SELECT * FROM jobs AS j
+                   WHERE j.state = 'queued'
+                     AND (SELECT COUNT(*) FROM jobs AS a WHERE a.host = j.host AND a.state = 'leased')
+                         < COALESCE((SELECT max_concurrency FROM host_limits WHERE host = j.host), ?)
+                   ORDER BY j.id LIMIT 1''',
+                (default_host_limit,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute(
+                '''UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?,
+                       lease_expires = ?, updated = ?
+                   WHERE id = ?''',
+                (worker_id, now + self.lease_seconds, now, row['id'])
+            )
+
+        job = dict(row)
+        job['args'] = json.loads(job['args'])
+        job['attempts'] += 1
+        return job
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend a lease; returns False if the worker no longer owns the job."""
+        now = time.time()
+        cursor = self.conn.execute(
+            '''UPDATE jobs SET lease_expires = ?, updated = ?
+               WHERE id = ? AND lease_owner = ? AND state = 'leased' ''',
+            (now + self.lease_seconds, now, job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id):
+        """Mark a leased job as done"""
+        self.conn.execute(
+            '''UPDATE jobs SET state = 'done', lease_owner = NULL, last_error = NULL, updated = ?
+               WHERE id = ? AND lease_owner = ? AND state = 'leased' ''',
+            (time.time(), job_id, worker_id)
+        )
+
+    def fail(self, job_id, worker_id, error):
+        """Release a failed job for retry, or mark it failed once it is out of attempts"""
+        self.conn.execute(
+            '''UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                   lease_owner = NULL, last_error = ?, updated = ?
+               WHERE id = ? AND lease_owner = ? AND state = 'leased' ''',
+            (self.max_attempts, error, time.time(), job_id, worker_id)
+        )
+
+    def counts(self):
+        """Return the number of jobs in each state"""
+        rows = self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        return {state: count for state, count in rows}
+
+    def has_pending(self):
+        """True while there are queued or leased jobs left"""
+        row = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')").fetchone()
+        return row[0] > 0
+
+
+class RemoteJobQueue:
+    """Client for a coordinator's HTTP API with the worker-side methods of JobQueue.
+
+    Workers on other nodes lease jobs through this, so the database, the lease expiry and
+    the per-host limits stay with the coordinator and hold across every node. Lease length
+    and host limits are the coordinator's; lease_seconds is taken from each claim.
+    """
+
+    def __init__(self, url, token=''):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.lease_seconds = 120
+
+    def call(self, path, payload=None):
+        """POST payload (or GET without one) to the coordinator and return the decoded reply"""
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = Request(f'{self.url}{path}', data=data, headers={'Content-Type': 'application/json'})
+        if self.token:
+            request.add_header('Authorization', f'Bearer {self.token}')
+        with urlopen(request, timeout=30) as response:
+            return json.load(response)
+
+    def reopen(self):
+        return RemoteJobQueue(self.url, self.token)
+
+    def close(self):
+        pass
+
+    def claim(self, worker_id, default_host_limit=None):
+        """Lease the next runnable job; the coordinator applies its own host limits"""
+        reply = self.call('/claim', {'worker_id': worker_id})
+        self.lease_seconds = reply['lease_seconds']
+        return reply['job']
+
+    def heartbeat(self, job_id, worker_id):
+        return self.call('/heartbeat', {'job_id': job_id, 'worker_id': worker_id})['ok']
+
+    def complete(self, job_id, worker_id):
+        self.call('/complete', {'job_id': job_id, 'worker_id': worker_id})
+
+    def fail(self, job_id, worker_id, error):
+        self.call('/fail', {'job_id': job_id, 'worker_id': worker_id, 'error': error})
+
+    def counts(self):
+        return self.call('/status')['counts']
+
+    def has_pending(self):
+        return self.call('/status')['pending']
+
+
+class CoordinatorServer(ThreadingHTTPServer):
+    """HTTP server that owns the coordinator's JobQueue; requests take turns on its connection"""
+
+    daemon_threads = True
+
+    def __init__(self, address, queue, default_host_limit, token=''):
+        super().__init__(address, CoordinatorRequestHandler)
+        self.queue = queue
+        self.default_host_limit = default_host_limit
+        self.token = token
+        self.lock = threading.Lock()
+
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    """POST /claim, /heartbeat, /complete and /fail with a JSON body; GET /status"""
+
+    def authorized(self):
+        expected = f'Bearer {self.server.token}'
+        if self.server.token and not hmac.compare_digest(self.headers.get('Authorization', ''), expected):
+            self.send_error(401, 'Missing or wrong token')
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path != '/status':
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self.respond({'counts': self.server.queue.counts(), 'pending': self.server.queue.has_pending()})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if self.path not in ('/claim', '/heartbeat', '/complete', '/fail'):
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            worker_id = str(body['worker_id'])
+            job_id = None if self.path == '/claim' else int(body['job_id'])
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400, 'Expected a JSON body with worker_id and, except for /claim, job_id')
+            return
+
+        queue = self.server.queue
+        with self.server.lock:
+            if self.path == '/claim':
+                reply = {'job': queue.claim(worker_id, self.server.default_host_limit), 'lease_seconds': queue.lease_seconds}
+            elif self.path == '/heartbeat':
+                reply = {'ok': queue.heartbeat(job_id, worker_id)}
+            elif self.path == '/complete':
+                queue.complete(job_id, worker_id)
+                reply = {'ok': True}
+            else:
+                queue.fail(job_id, worker_id, str(body.get('error', '')))
+                reply = {'ok': True}
+        self.respond(reply)
+
+    def respond(self, reply):
+        payload = json.dumps(reply).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_job(queue, job, worker_id):
+    """Run one generator in its own directory while keeping its lease alive."""
+    cwd = os.path.join(REPO_ROOT, job['directory'])
+    # Generators of the same run share per-run state, such as the Sparta article cache
+    env = dict(os.environ, FEED_RUN_ID=job['run_id']) if job.get('run_id') else None
+    try:
+        process = subprocess.Popen(
+            [sys.executable, 'generate_feed.py', *job['args']],
+            cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+    except OSError as e:
+        # A bad directory in the source list must not take the worker down with the lease still held
+        queue.fail(job['id'], worker_id, f"Could not start generator: {e}")
+        print(f"[{worker_id}] Could not start {job['name']}: {e} (attempt {job['attempts']})")
+        return
+
+    finished = threading.Event()
+    lost_lease = threading.Event()
+
+    def keep_alive():
+        # A separate connection: the worker's own one is busy in the main thread
+        heartbeat_queue = queue.reopen()
+        try:
+            while not finished.wait(queue.lease_seconds / 3):
+                try:
+                    alive = heartbeat_queue.heartbeat(job['id'], worker_id)
+                except OSError as e:
+                    # Coordinator briefly unreachable; the lease lasts for two more beats
+                    print(f"[{worker_id}] Heartbeat for {job['name']} failed: {e}")
+                    continue
+                if not alive:
+                    lost_lease.set()
+                    process.kill()
+                    return
+        finally:
+            heartbeat_queue.close()
+
+    heartbeat_thread = threading.Thread(target=keep_alive, daemon=True)
+    heartbeat_thread.start()
+    output, _ = process.communicate()
+    finished.set()
+    heartbeat_thread.join()
+
+    if lost_lease.is_set():
+        print(f"[{worker_id}] Lost lease on {job['name']}, abandoning it")
+    elif process.returncode == 0:
+        queue.complete(job['id'], worker_id)
+        print(f"[{worker_id}] Finished {job['name']}")
+    else:
+        queue.fail(job['id'], worker_id, output[-2000:])
+        print(f"[{worker_id}] {job['name']} failed with exit code {process.returncode} (attempt {job['attempts']})")
+
+
+def worker_loop(db_path, coordinator_url, token, lease_seconds, max_attempts, default_host_limit, poll_interval):
+    """Claim and run jobs until the queue has nothing left, from the local database or a coordinator"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    if coordinator_url:
+        queue = RemoteJobQueue(coordinator_url, token)
+    else:
+        queue = JobQueue(db_path, lease_seconds, max_attempts)
+    try:
+        while True:
+            try:
+                job = queue.claim(worker_id, default_host_limit)
+                if job is None:
+                    if not queue.has_pending():
+                        break
+                    # Everything left is leased or blocked by a host limit
+                    time.sleep(poll_interval)
+                    continue
+                print(f"[{worker_id}] Running {job['name']} (attempt {job['attempts']})")
+                run_job(queue, job, worker_id)
+            except OSError as e:
+                # Only a remote queue raises this: the coordinator stops serving once its queue has drained
+                print(f"[{worker_id}] Coordinator unreachable, stopping: {e}")
+                break
+    finally:
+        queue.close()
+
+
+def load_sources(path):
+    """Load the source list from a JSON file, or use the generators in this repository"""
+    if not path:
+        return DEFAULT_SOURCES
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_host_limits(values):
+    """Parse repeated HOST=N options"""
+    limits = {}
+    for value in values or []:
+        host, _, limit = value.partition('=')
+        limits[host] = int(limit)
+    return limits
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run feed generators as jobs from a shared lease-based queue')
+    parser.add_argument('--db', default='jobs.db', help='Path to the SQLite queue on the coordinator host (local disk only)')
+    parser.add_argument('--lease-seconds', type=float, default=120, help='Lease duration; workers heartbeat at a third of this')
+    parser.add_argument('--max-attempts', type=int, default=3, help='Attempts before a job is marked failed')
+    parser.add_argument('--token', default=os.environ.get('RUNNER_TOKEN', ''),
+                        help='Shared secret for the coordinator API (defaults to $RUNNER_TOKEN)')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    coordinator = subparsers.add_parser('coordinator', help='Enqueue one job per source and serve the queue until it drains')
+    coordinator.add_argument('--sources', help='JSON file with a list of {name, directory, host, args} sources')
+    coordinator.add_argument('--host-limit', action='append', metavar='HOST=N', help='Maximum concurrent jobs for a host')
+    coordinator.add_argument('--default-host-limit', type=int, default=1, help='Concurrent jobs per host without an explicit limit')
+    coordinator.add_argument('--listen', default='127.0.0.1:8700', metavar='HOST:PORT',
+                             help='Address of the HTTP API remote workers lease jobs from')
+    coordinator.add_argument('--linger', type=float, default=5, help='Seconds to keep serving after the queue drains, so idle workers see it')
+    coordinator.add_argument('--no-wait', action='store_true', help='Return right after enqueueing, for local workers only')
+
+    worker = subparsers.add_parser('worker', help='Run jobs from the queue until it is empty')
+    worker.add_argument('--coordinator', metavar='URL', help='Lease jobs from a coordinator, e.g. http://host:8700, instead of --db')
+    worker.add_argument('--processes', type=int, default=1, help='Number of worker processes to start on this node')
+    worker.add_argument('--default-host-limit', type=int, default=1,
+                        help='Concurrent jobs per host without an explicit limit (with --db; a coordinator uses its own)')
+    worker.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no job can be claimed')
+
+    status = subparsers.add_parser('status', help='Print the number of jobs in each state')
+    status.add_argument('--coordinator', metavar='URL', help='Ask a coordinator instead of reading --db')
+
+    args = parser.parse_args()
+    if getattr(args, 'coordinator', None):
+        queue = RemoteJobQueue(args.coordinator, args.token)
+    else:
+        queue = JobQueue(args.db, args.lease_seconds, args.max_attempts)
+
+    if args.mode == 'coordinator':
+        for host, limit in parse_host_limits(args.host_limit).items():
+            queue.set_host_limit(host, limit)
+        run_id = os.environ.get('FEED_RUN_ID') or uuid.uuid4().hex[:12]
+        count = queue.enqueue(load_sources(args.sources), run_id)
+        print(f"Enqueued {count} jobs for run {run_id} in {args.db}")
+        if not args.no_wait:
+            host, _, port = args.listen.rpartition(':')
+            server = CoordinatorServer((host, int(port)), queue, args.default_host_limit, args.token)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            print(f"Serving the queue on http://{args.listen}")
+            while True:
+                with server.lock:
+                    if not queue.has_pending():
+                        break
+                time.sleep(2)
+            time.sleep(args.linger)
+            server.shutdown()
+            print(f"Queue drained: {queue.counts()}")
+
+    elif args.mode == 'worker':
+        worker_args = (args.db, args.coordinator, args.token, args.lease_seconds, args.max_attempts,
+                       args.default_host_limit, args.poll_interval)
+        processes = [multiprocessing.Process(target=worker_loop, args=worker_args) for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        try:
+            print(f"Workers finished: {queue.counts()}")
+        except OSError:
+            print("Workers finished")
+
+    else:
+        print(json.dumps(queue.counts()))
+
+    queue.close()
@@ -0,0 +1,257 @@
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+import argparse
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+# Helpers shared with the generators
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from feed_common import content_digest
+
+# Upper bound for the number of results a single HTTP query may ask for
+MAX_LIMIT = 100
+
+# Parts of item descriptions that change on every run without the item being edited,
+# like the view count in Kia descriptions ("Category: Navigation | Views: 1234")
+VOLATILE_TEXT = re.compile(r'\s*\|\s*Views:\s*[\d.,]+', re.I)
+
+
+def strip_volatile(text):
+    """Remove text that changes between runs, so it is neither indexed nor fingerprinted"""
+    return VOLATILE_TEXT.sub('', text)
+
+
+def html_to_text(markup):
+    """Strip tags from an item description so only the readable text is indexed"""
+    text = re.sub(r'<(script|style)\b.*?</\1>', ' ', markup or '', flags=re.S | re.I)
+    text = re.sub(r'<[^>]+>', ' ', text)
+    return re.sub(r'\s+', ' ', html.unescape(text)).strip()
+
+
+class SearchIndex:
+    """Full-text index of feed items in SQLite FTS5.
+
+    Items are keyed by GUID, with the '#rev-' suffix of edited items stripped, so an
+    edit replaces the earlier version instead of adding a second result.
+    """
+
+    def __init__(self, path):
+        # One connection is shared by the threaded HTTP server, guarded by a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                guid TEXT NOT NULL UNIQUE,
+                feed TEXT NOT NULL,
+                title TEXT NOT NULL,
+                link TEXT,
+                description TEXT,
+                body TEXT NOT NULL,
+                pub_date TEXT,
+                fingerprint TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                title, body, content='items', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+                INSERT INTO items_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+                INSERT INTO items_fts (items_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS items_au AFTER UPDATE ON items BEGIN
+                INSERT INTO items_fts (items_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+                INSERT INTO items_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+            END;
+        ''')
+
+    def close(self):
+        self.conn.close()
+
+    def index_feed(self, path):
+        """Add or update the items of one feed file; returns (added, updated, unchanged)"""
+        added = updated = unchanged = 0
+        feed_title = ''
+        with self.conn:
+            for _, elem in ET.iterparse(path, events=('end',)):
+                if elem.tag == 'title' and not feed_title:
+                    feed_title = elem.text or ''
+                if elem.tag != 'item':
+                    continue
+
+                title = elem.findtext('title') or ''
+                link = elem.findtext('link') or ''
+                description = strip_volatile(elem.findtext('description') or '')
+                guid = (elem.findtext('guid') or link or title).split('#rev-')[0]
+                pub_date = elem.findtext('pubDate')
+                elem.clear()
+
+                body = html_to_text(description)
+                fingerprint = content_digest(title, link, pub_date or '', body)
+                row = self.conn.execute('SELECT fingerprint FROM items WHERE guid = ?', (guid,)).fetchone()
+                if row is not None and row['fingerprint'] == fingerprint:
+                    unchanged += 1
+                    continue
+
+                values = (feed_title, title, link, description, body, pub_date, fingerprint, guid)
+                if row is None:
+                    self.conn.execute(
+                        '''INSERT INTO items (feed, title, link, description, body, pub_date, fingerprint, guid)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', values
+                    )
+                    added += 1
+                else:
+                    self.conn.execute(
+                        '''UPDATE items SET feed = ?, title = ?, link = ?, description = ?, body = ?,
+                               pub_date = ?, fingerprint = ?
+                           WHERE guid = ?''', values
+                    )
+                    updated += 1
+        return added, updated, unchanged
+
+    def search(self, query, limit=20):
+        """Return the best matching items for a query, with a highlighted snippet"""
+        sql = '''SELECT items.guid, items.feed, items.title, items.link, items.pub_date,
+                        snippet(items_fts, 1, '[', ']', '…', 16) AS snippet,
+                        bm25(items_fts, 10.0, 1.0) AS rank
+                 FROM items_fts JOIN items ON items.id = items_fts.rowid
+                 WHERE items_fts MATCH ?
+                 ORDER BY rank LIMIT ?'''
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax: search for the words as plain terms instead
+                words = [word for word in re.findall(r'\w+', query) if word not in ('AND', 'OR', 'NOT', 'NEAR')]
+                terms = ' '.join(f'"{word}"' for word in words)
+                if not terms:
+                    return []
+                rows = self.conn.execute(sql, (terms, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+
+def create_search_feed(query, results):
+    """Create an ad-hoc RSS feed from search results"""
+    rss = ET.Element('rss', version='2.0')
+    channel = ET.SubElement(rss, 'channel')
+
+    # Add channel metadata
+    ET.SubElement(channel, 'title').text = f'Zoekresultaten: {query}'
+    ET.SubElement(channel, 'link').text = ''
+    ET.SubElement(channel, 'description').text = f'Items uit alle feeds die overeenkomen met "{query}"'
+    ET.SubElement(channel, 'lastBuildDate').text = datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')
+    ET.SubElement(channel, 'generator').text = 'Feed Search'
+
+    # Add items
+    for result in results:
+        item = ET.SubElement(channel, 'item')
+        ET.SubElement(item, 'title').text = result['title']
+        ET.SubElement(item, 'link').text = result['link']
+        ET.SubElement(item, 'description').text = result['snippet']
+        if result['pub_date']:
+            ET.SubElement(item, 'pubDate').text = result['pub_date']
+        ET.SubElement(item, 'guid', isPermaLink='false').text = result['guid']
+        ET.SubElement(item, 'category').text = result['feed']
+
+    # Pretty print XML
+    xml_str = ET.tostring(rss, encoding='unicode')
+    dom = minidom.parseString(xml_str)
+    return dom.toprettyxml(indent='  ')
+
+
+def format_results(query, results, output_format):
+    """Render results as JSON or as an RSS search feed; returns (content type, body)"""
+    if output_format == 'rss':
+        return 'application/rss+xml; charset=utf-8', create_search_feed(query, results)
+    return 'application/json; charset=utf-8', json.dumps({'query': query, 'results': results}, ensure_ascii=False, indent=2)
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    index = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != '/search':
+            self.send_error(404)
+            return
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        query = params.get('q', '').strip()
+        if not query:
+            self.send_error(400, 'Missing q parameter')
+            return
+
+        try:
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_LIMIT:
+            self.send_error(400, f'limit must be a number from 1 to {MAX_LIMIT}')
+            return
+
+        results = self.index.search(query, limit)
+        content_type, body = format_results(query, results, params.get('format', 'json'))
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Full-text search over all generated feed items')
+    parser.add_argument('--db', default='search_index.db', help='Path to the SQLite search index')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    index_parser = subparsers.add_parser('index', help='Add new and changed items from feed files')
+    index_parser.add_argument('feeds', nargs='+', help='RSS files written by the generators')
+
+    query_parser = subparsers.add_parser('query', help='Search the index')
+    query_parser.add_argument('query', help='Search terms (FTS5 syntax is allowed)')
+    query_parser.add_argument('--limit', type=int, default=20, help='Maximum number of results')
+    query_parser.add_argument('--format', choices=['json', 'rss'], default='json', help='Output format')
+
+    serve_parser = subparsers.add_parser('serve', help='Serve GET /search?q=...&format=json|rss over HTTP')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    serve_parser.add_argument('--port', type=int, default=8081, help='Port to listen on')
+
+    args = parser.parse_args()
+
+    if args.mode == 'index':
+        index = SearchIndex(args.db)
+        for feed in args.feeds:
+            # A source that failed this run has no feed file; its items stay in the index
+            if not os.path.exists(feed):
+                print(f"Skipping {feed}: not found")
+                continue
+            added, updated, unchanged = index.index_feed(feed)
+            print(f"{feed}: {added} added, {updated} updated, {unchanged} unchanged")
+        index.close()
+
+    elif args.mode == 'query':
+        index = SearchIndex(args.db)
+        _, body = format_results(args.query, index.search(args.query, args.limit), args.format)
+        print(body)
+        index.close()
+
+    else:
+        SearchRequestHandler.index = SearchIndex(args.db)
+        server = ThreadingHTTPServer((args.host, args.port), SearchRequestHandler)
+        print(f"Search endpoint listening on http://{args.host}:{args.port}/search")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -6,6 +6,15 @@ import xml.etree.ElementTree as ET
 from xml.dom import minidom
 import re
 import time
+import argparse
+import codecs
+import os
+import sys
+import tempfile
+
+# Helpers shared with the other generators
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from feed_common import ArticleDetailCache, canonical_url, content_digest, current_run_id, ItemTracker, mount_cassette, NewsItemStreamParser
 
 # Note: The Sparta Rotterdam website is protected by Cloudflare's advanced bot protection.
 # The cloudscraper library attempts to bypass basic Cloudflare protection, but may not work
@@ -25,6 +34,31 @@ class SpartaKidsRSSGenerator:
                 'mobile': False
             }
         )
+        self.request_delay = 0.7  # Be polite between article requests
+        self.max_articles = 8
+        self.state_file = '.feed_state.json'
+        self.last_build_date = None
+        # WebSub: where the feed is published and which hub to advertise; websub_hub/ping_hub.py
+        # notifies the hub once the feeds are deployed
+        self.feed_base_url = os.environ.get('FEED_BASE_URL', '').rstrip('/')
+        self.hub_url = os.environ.get('WEBSUB_HUB_URL', '')
+        self.feed_filename = 'sparta_rss.xml'
+        # Article pages are shared with the other Sparta feed, so they are fetched once per run;
+        # without a run id there is nothing to share with and every page is fetched directly
+        self.detail_cache = None
+        run_id = current_run_id()
+        if run_id:
+            cache_root = os.environ.get('SPARTA_DETAIL_CACHE', os.path.join(tempfile.gettempdir(), 'sparta_detail_cache'))
+            self.detail_cache = ArticleDetailCache(cache_root, run_id)
+
+    def use_cassette(self, record_dir=None, replay_dir=None):
+        """Record all HTTP traffic to, or replay it from, a cassette directory."""
+        mount_cassette(self.session, record_dir=record_dir, replay_dir=replay_dir)
+        if record_dir or replay_dir:
+            # Every article request has to reach the cassette, so the shared detail cache is bypassed
+            self.detail_cache = None
+        if replay_dir:
+            self.request_delay = 0
 
     def print_cloudflare_error_message(self):
         """Print informative error message about Cloudflare protection."""
@@ -52,28 +86,33 @@ class SpartaKidsRSSGenerator:
     def fetch_articles(self):
         """Fetch articles from Sparta Rotterdam Kidsclub website"""
         try:
-            response = self.session.get(self.site_url, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Stream the listing page and stop as soon as enough news items have been seen
+            with self.session.get(self.site_url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                parser = NewsItemStreamParser(self.max_articles)
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                for chunk in response.iter_content(chunk_size=16384):
+                    parser.feed(decoder.decode(chunk))
+                    if parser.done:
+                        break
+                else:
+                    parser.feed(decoder.decode(b'', final=True))
+                    parser.close()
+
             articles = []
 
-            # Try to find news items with various selectors
-            news_items = soup.select('article.news_item')
-            
-            if not news_items:
-                # Try alternative selectors
-                news_items = soup.find_all('article', class_=lambda x: x and 'news' in str(x).lower())
-            
+            # Fall back to articles with any news-like class if no news_item was found
+            news_items = parser.news_items or parser.fallback_items
+
             if not news_items:
                 print("No articles found with expected selectors")
                 return []
 
-            for art in news_items[:8]:
+            for markup in news_items[:self.max_articles]:
+                art = BeautifulSoup(markup, 'html.parser').article
                 article = self.parse_article(art)
                 if article:
                     articles.append(article)
-                    time.sleep(0.7)  # Be polite
 
             return articles
             
@@ -121,7 +160,13 @@ class SpartaKidsRSSGenerator:
 
             # Fetch article details
             print(f"Fetching details for: {title}")
-            pub_date, article_html = self.fetch_article_details(link)
+            try:
+                pub_date, article_html = self.fetch_article_details(link)
+                details_fetched = True
+            except Exception as e:
+                print(f"Error scraping {link}: {e}")
+                pub_date, article_html = datetime.now(), "Could not fetch article content."
+                details_fetched = False
 
             # Compose description
             description = ""
@@ -135,7 +180,8 @@ class SpartaKidsRSSGenerator:
                 'title': title,
                 'link': link,
                 'description': description,
-                'pubDate': pub_date
+                'pubDate': pub_date,
+                'details_fetched': details_fetched
             }
             
         except Exception as e:
@@ -143,39 +189,61 @@ class SpartaKidsRSSGenerator:
             return None
 
     def fetch_article_details(self, url):
+        """Return (published_date, main_html_content) for an article, from the shared cache when possible"""
+        if self.detail_cache is None:
+            return self.scrape_article_details(url)
+        return self.detail_cache.get_or_fetch(url, self.scrape_article_details)
+
+    def scrape_article_details(self, url):
         """Visit the article URL and return (published_date, main_html_content)"""
-        try:
-            resp = self.session.get(url, timeout=15)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-
-            article = soup.find('article', class_='single')
-            if not article:
-                return datetime.now(), ""
-
-            # Extract date
-            date_span = article.find('span', class_='datetime')
-            if date_span:
-                pub_date = self.parse_nl_datetime(date_span.text.strip())
+        resp = self.session.get(url, timeout=15)
+        time.sleep(self.request_delay)  # Be polite
+        resp.raise_for_status()
+        soup = BeautifulSoup(resp.text, 'html.parser')
+
+        article = soup.find('article', class_='single')
+        if not article:
+            return datetime.now(), ""
+
+        # Extract date
+        date_span = article.find('span', class_='datetime')
+        if date_span:
+            pub_date = self.parse_nl_datetime(date_span.text.strip())
+        else:
+            pub_date = datetime.now()
+
+        # Extract article content
+        body_html = ""
+        for el in article.find_all(['p', 'div', 'img', 'em'], recursive=True):
+            if el.name in ('style', 'script'):
+                continue
+            if el.name == "div":
+                if "gallery" in el.get("class", []):
+                    body_html += str(el)
+                continue
+            body_html += str(el)
+
+        return pub_date, body_html
+
+    def track_items(self, articles):
+        """Assign stable GUIDs and report which articles are new or changed since the last run"""
+        tracker = ItemTracker(self.state_file)
+        statuses = []
+        for article in articles:
+            # The canonical URL only keys the state; the GUID stays the link as published
+            identity = canonical_url(article['link'])
+            if article['details_fetched']:
+                fingerprint = content_digest(article['title'], article['description'])
+                article['guid'], status = tracker.track(identity, fingerprint, article['link'])
             else:
-                pub_date = datetime.now()
-
-            # Extract article content
-            body_html = ""
-            for el in article.find_all(['p', 'div', 'img', 'em'], recursive=True):
-                if el.name in ('style', 'script'):
-                    continue
-                if el.name == "div":
-                    if "gallery" in el.get("class", []):
-                        body_html += str(el)
-                    continue
-                body_html += str(el)
-
-            return pub_date, body_html
+                # The placeholder text is not the article's content, so it must not count as an edit
+                article['guid'], status = tracker.keep(identity, article['link'])
+            statuses.append(status)
 
-        except Exception as e:
-            print(f"Error scraping {url}: {e}")
-            return datetime.now(), "Could not fetch article content."
+        new, changed = statuses.count('new'), statuses.count('changed')
+        self.last_build_date = tracker.build_date(new or changed)
+        tracker.save()
+        print(f"{new} new, {changed} changed, {len(articles) - new - changed} unchanged")
 
     def create_rss_feed(self, articles):
         """Create RSS feed from articles"""
@@ -191,9 +259,14 @@ class SpartaKidsRSSGenerator:
         rss_parts.append(f'<link>{escape(self.site_url)}</link>')
         rss_parts.append(f'<description>{escape("Ongeofficieel RSS-nieuwsfeed voor Sparta Rotterdam Kidsclub")}</description>')
         rss_parts.append('<language>nl-NL</language>')
-        rss_parts.append(f'<lastBuildDate>{datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0000")}</lastBuildDate>')
+        rss_parts.append(f'<lastBuildDate>{(self.last_build_date or datetime.now()).strftime("%a, %d %b %Y %H:%M:%S +0000")}</lastBuildDate>')
         rss_parts.append('<generator>Sparta Rotterdam Kidsclub RSS Generator</generator>')
 
+        # Advertise the WebSub hub so readers can subscribe instead of polling
+        if self.hub_url and self.feed_url():
+            rss_parts.append(f'<atom:link href="{escape(self.feed_url())}" rel="self" type="application/rss+xml"/>')
+            rss_parts.append(f'<atom:link href="{escape(self.hub_url)}" rel="hub"/>')
+
         # Add items
         for article in articles:
             rss_parts.append('<item>')
@@ -205,7 +278,9 @@ class SpartaKidsRSSGenerator:
             
             pub_date = article['pubDate']
             rss_parts.append(f'<pubDate>{pub_date.strftime("%a, %d %b %Y %H:%M:%S +0100")}</pubDate>')
-            rss_parts.append(f'<guid isPermaLink="true">{escape(article["link"])}</guid>')
+            guid = article.get('guid', article['link'])
+            is_permalink = 'true' if guid == article['link'] else 'false'
+            rss_parts.append(f'<guid isPermaLink="{is_permalink}">{escape(guid)}</guid>')
             rss_parts.append('</item>')
 
         rss_parts.append('</channel>')
@@ -220,8 +295,20 @@ class SpartaKidsRSSGenerator:
             # If pretty printing fails, return as-is
             return xml_str
 
-    def save_rss_feed(self, rss_content, filename='sparta_rss.xml'):
-        """Save RSS feed to file"""
+    def feed_url(self, filename=None):
+        """Public URL of a feed file written by this generator, or None if FEED_BASE_URL is not set"""
+        if not self.feed_base_url:
+            return None
+        return f"{self.feed_base_url}/sparta_kids/{filename or self.feed_filename}"
+
+    def save_rss_feed(self, rss_content, filename=None):
+        """Save RSS feed to file, leaving it untouched when the content did not change"""
+        filename = filename or self.feed_filename
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as f:
+                if f.read() == rss_content:
+                    print(f"RSS feed {filename} is unchanged")
+                    return
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(rss_content)
         print(f"RSS feed saved to {filename}")
@@ -236,6 +323,7 @@ class SpartaKidsRSSGenerator:
             return None
 
         print(f"\nFound {len(articles)} articles")
+        self.track_items(articles)
 
         print("\nCreating RSS feed...")
         rss_feed = self.create_rss_feed(articles)
@@ -244,7 +332,19 @@ class SpartaKidsRSSGenerator:
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate the Sparta Rotterdam Kidsclub RSS feed')
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='DIR', help='Record all HTTP requests and responses to a cassette directory')
+    cassette.add_argument('--replay', metavar='DIR', help='Serve HTTP responses from a cassette directory without network access')
+    parser.add_argument('--no-detail-cache', action='store_true', help='Always fetch article pages instead of sharing them with the other Sparta feed')
+    parser.add_argument('--state', default='.feed_state.json', help='File with item GUIDs and fingerprints kept between runs')
+    args = parser.parse_args()
+
     generator = SpartaKidsRSSGenerator()
+    generator.state_file = args.state
+    generator.use_cassette(record_dir=args.record, replay_dir=args.replay)
+    if args.no_detail_cache:
+        generator.detail_cache = None
     rss_feed = generator.generate_feed()
 
     if rss_feed:
@@ -2,6 +2,16 @@ import requests
 from datetime import datetime
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
+import argparse
+import os
+import sys
+
+# Helpers shared with the other generators
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from feed_common import add_to_partition, canonical_url, content_digest, derive_option, ItemTracker, matches_filter, mount_cassette, slugify
+
+ET.register_namespace('atom', 'http://www.w3.org/2005/Atom')
+
 
 class UIBlogRSSGenerator:
     def __init__(self):
@@ -11,11 +21,26 @@ class UIBlogRSSGenerator:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'application/json',
         }
+        self.session = requests.Session()
+        self.state_file = '.feed_state.json'
+        self.last_build_date = None
+        # WebSub: where the feed is published and which hub to advertise; websub_hub/ping_hub.py
+        # notifies the hub once the feeds are deployed
+        self.feed_base_url = os.environ.get('FEED_BASE_URL', '').rstrip('/')
+        self.hub_url = os.environ.get('WEBSUB_HUB_URL', '')
+        self.feed_filename = 'ui_blog_rss.xml'
+        # Extra feeds on top of the per-tag ones: name -> parsed filter expression
+        self.derived_filters = {}
+        self.derived_feeds = {}
+
+    def use_cassette(self, record_dir=None, replay_dir=None):
+        """Record all HTTP traffic to, or replay it from, a cassette directory."""
+        mount_cassette(self.session, record_dir=record_dir, replay_dir=replay_dir)
 
     def fetch_articles(self):
         """Fetch articles from the blog API"""
         try:
-            response = requests.get(self.api_url, headers=self.headers, timeout=15)
+            response = self.session.get(self.api_url, headers=self.headers, timeout=15)
             response.raise_for_status()
             data = response.json()
             return data.get('data', [])
@@ -40,26 +65,94 @@ class UIBlogRSSGenerator:
 
         return datetime.now()
 
-    def create_rss_feed(self, articles):
+    def article_link(self, article):
+        """Return the public URL of an article"""
+        slug = article.get('slug', '')
+        return f"{self.base_url}/article/{slug}" if slug else self.base_url
+
+    def cover_url(self, article):
+        """Return the cover image URL, preferring the large format"""
+        cover = article.get('cover', {})
+        if not cover:
+            return None
+        if cover.get('formats', {}).get('large'):
+            return cover['formats']['large'].get('url')
+        return cover.get('url')
+
+    def track_items(self, articles):
+        """Assign stable GUIDs and report which articles are new or changed since the last run"""
+        tracker = ItemTracker(self.state_file)
+        statuses = []
+        for article in articles:
+            if not article.get('isVisible', True):
+                continue
+            guid = None
+            if article.get('slug'):
+                identity, guid = canonical_url(self.article_link(article)), self.article_link(article)
+            else:
+                identity = f"urn:sha256:{content_digest(article.get('title', ''), article.get('createdAt', ''))}"
+            fingerprint = content_digest(article.get('title', ''), article.get('description', ''), self.cover_url(article) or '')
+            article['guid'], status = tracker.track(identity, fingerprint, guid)
+            statuses.append(status)
+
+        new, changed = statuses.count('new'), statuses.count('changed')
+        self.last_build_date = tracker.build_date(new or changed)
+        tracker.save()
+        print(f"{new} new, {changed} changed, {len(statuses) - new - changed} unchanged")
+
+    def article_tags(self, article):
+        """Return the tag names of an article; tags may be plain strings or objects with a name"""
+        tags = []
+        for tag in article.get('tags') or []:
+            name = (tag.get('name') or tag.get('title')) if isinstance(tag, dict) else tag
+            if name:
+                tags.append(str(name))
+        return tags
+
+    def partition_articles(self, articles):
+        """Split visible articles into per-tag and filtered feeds in a single pass.
+
+        Returns a dict of filename -> (title suffix, articles). Filtered feeds are named
+        ui_blog_rss_filter-<name>.xml, so they never collide with a tag feed.
+        """
+        partitions = {}
+        for article in articles:
+            if not article.get('isVisible', True):
+                continue
+            tags = self.article_tags(article)
+            for tag in tags:
+                add_to_partition(partitions, f"ui_blog_rss-{slugify(tag)}.xml", tag, article)
+            for name, item_filter in self.derived_filters.items():
+                if matches_filter(tags, item_filter):
+                    add_to_partition(partitions, f"ui_blog_rss_filter-{slugify(name)}.xml", name, article)
+        return partitions
+
+    def create_rss_feed(self, articles, title_suffix=None, filename=None):
         """Create RSS feed from articles"""
         rss = ET.Element('rss', version='2.0')
-        rss.set('xmlns:atom', 'http://www.w3.org/2005/Atom')
         channel = ET.SubElement(rss, 'channel')
 
         # Add channel metadata
-        ET.SubElement(channel, 'title').text = 'UI.com Blog - Unofficial RSS Feed'
+        title = 'UI.com Blog - Unofficial RSS Feed'
+        ET.SubElement(channel, 'title').text = f"{title} ({title_suffix})" if title_suffix else title
         ET.SubElement(channel, 'link').text = self.base_url
         ET.SubElement(channel, 'description').text = 'Unofficial RSS feed for Ubiquiti UI.com blog posts'
         ET.SubElement(channel, 'language').text = 'en-US'
-        ET.SubElement(channel, 'lastBuildDate').text = datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')
+        ET.SubElement(channel, 'lastBuildDate').text = (self.last_build_date or datetime.now()).strftime('%a, %d %b %Y %H:%M:%S +0000')
         ET.SubElement(channel, 'generator').text = 'UI Blog RSS Generator'
 
         # Add atom:link for self-reference
         atom_link = ET.SubElement(channel, '{http://www.w3.org/2005/Atom}link')
-        atom_link.set('href', self.base_url + '/rss')
+        atom_link.set('href', self.feed_url(filename) or self.base_url + '/rss')
         atom_link.set('rel', 'self')
         atom_link.set('type', 'application/rss+xml')
 
+        # Advertise the WebSub hub so readers can subscribe instead of polling
+        if self.hub_url and self.feed_url(filename):
+            hub_link = ET.SubElement(channel, '{http://www.w3.org/2005/Atom}link')
+            hub_link.set('href', self.hub_url)
+            hub_link.set('rel', 'hub')
+
         # Add items
         for article in articles:
             if not article.get('isVisible', True):
@@ -72,23 +165,14 @@ class UIBlogRSSGenerator:
             ET.SubElement(item, 'title').text = title
             
             # Link
-            slug = article.get('slug', '')
-            link = f"{self.base_url}/article/{slug}" if slug else self.base_url
+            link = self.article_link(article)
             ET.SubElement(item, 'link').text = link
             
             # Description with cover image
             description = ""
-            cover = article.get('cover', {})
-            if cover:
-                # Use the large format if available, otherwise use the url
-                cover_url = None
-                if cover.get('formats', {}).get('large'):
-                    cover_url = cover['formats']['large'].get('url')
-                elif cover.get('url'):
-                    cover_url = cover['url']
-                    
-                if cover_url:
-                    description += f'<img src="{cover_url}" alt="{title}"><br><br>'
+            cover_url = self.cover_url(article)
+            if cover_url:
+                description += f'<img src="{cover_url}" alt="{title}"><br><br>'
             
             # Add article description
             article_desc = article.get('description', '')
@@ -104,7 +188,8 @@ class UIBlogRSSGenerator:
                 ET.SubElement(item, 'pubDate').text = pub_date.strftime('%a, %d %b %Y %H:%M:%S +0000')
             
             # GUID
-            ET.SubElement(item, 'guid', isPermaLink='true').text = link
+            guid = article.get('guid', link)
+            ET.SubElement(item, 'guid', isPermaLink='true' if guid == link else 'false').text = guid
             
             # Author
             author = article.get('author', {})
@@ -113,13 +198,29 @@ class UIBlogRSSGenerator:
                 if author_name:
                     ET.SubElement(item, 'author').text = author_name
 
+            # Tags
+            for tag in self.article_tags(article):
+                ET.SubElement(item, 'category').text = tag
+
         # Pretty print XML
         xml_str = ET.tostring(rss, encoding='unicode')
         dom = minidom.parseString(xml_str)
         return dom.toprettyxml(indent='  ')
 
-    def save_rss_feed(self, rss_content, filename='ui_blog_rss.xml'):
-        """Save RSS feed to file"""
+    def feed_url(self, filename=None):
+        """Public URL of a feed file written by this generator, or None if FEED_BASE_URL is not set"""
+        if not self.feed_base_url:
+            return None
+        return f"{self.feed_base_url}/ui_blog/{filename or self.feed_filename}"
+
+    def save_rss_feed(self, rss_content, filename=None):
+        """Save RSS feed to file, leaving it untouched when the content did not change"""
+        filename = filename or self.feed_filename
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as f:
+                if f.read() == rss_content:
+                    print(f"RSS feed {filename} is unchanged")
+                    return
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(rss_content)
         print(f"RSS feed saved to {filename}")
@@ -138,18 +239,38 @@ class UIBlogRSSGenerator:
             pub_date = article.get('createdAt') or article.get('publishedAt', '')
             pub_date_obj = self.parse_date(pub_date) if pub_date else datetime.now()
             print(f"  - {article.get('title', 'Untitled')} ({pub_date_obj.strftime('%Y-%m-%d')})")
+        self.track_items(articles)
 
         print("\nCreating RSS feed...")
         rss_feed = self.create_rss_feed(articles)
 
+        self.derived_feeds = {}
+        for filename, (title_suffix, partition) in self.partition_articles(articles).items():
+            self.derived_feeds[filename] = self.create_rss_feed(partition, title_suffix, filename)
+        print(f"Created {len(self.derived_feeds)} tag feeds")
+
         return rss_feed
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate the UI.com blog RSS feed')
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='DIR', help='Record all HTTP requests and responses to a cassette directory')
+    cassette.add_argument('--replay', metavar='DIR', help='Serve HTTP responses from a cassette directory without network access')
+    parser.add_argument('--state', default='.feed_state.json', help='File with item GUIDs and fingerprints kept between runs')
+    parser.add_argument('--derive', action='append', default=[], metavar='NAME=EXPR', type=derive_option,
+                        help="Extra feed of items whose tags match EXPR, e.g. 'network=unifi network -protect'")
+    args = parser.parse_args()
+
     # Generate RSS feed
     generator = UIBlogRSSGenerator()
+    generator.state_file = args.state
+    generator.derived_filters = dict(args.derive)
+    generator.use_cassette(record_dir=args.record, replay_dir=args.replay)
     rss_feed = generator.generate_feed()
 
     if rss_feed:
         generator.save_rss_feed(rss_feed)
+        for filename, derived_feed in generator.derived_feeds.items():
+            generator.save_rss_feed(derived_feed, filename)
         print("\nRSS feed generated successfully!")
@@ -0,0 +1,217 @@
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+import xml.etree.ElementTree as ET
+import argparse
+import copy
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+ET.register_namespace('atom', 'http://www.w3.org/2005/Atom')
+
+
+class WebSubHub:
+    """Minimal WebSub hub: verified subscriptions and content-diff fan-out on publish.
+
+    When a publisher pings a topic, the hub fetches it, keeps only the items that are new
+    or changed since the previous fetch and pushes that smaller feed to every subscriber
+    of the topic concurrently. Topics without subscribers are not fetched and their item
+    digests are dropped. With a topic_prefix only topics under it are accepted, so the hub
+    cannot be made to fetch arbitrary URLs.
+    """
+
+    def __init__(self, hub_url, max_workers=16, default_lease_seconds=10 * 86400, topic_prefix=''):
+        self.hub_url = hub_url
+        # A trailing slash, so https://feeds.example does not also admit https://feeds.example.org
+        self.topic_prefix = topic_prefix.rstrip('/') + '/' if topic_prefix else ''
+        self.default_lease_seconds = default_lease_seconds
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        # topic -> callback -> {'secret': str, 'expires': timestamp}
+        self.subscriptions = {}
+        # topic -> item key -> content digest, from the last fetch
+        self.item_digests = {}
+
+    def subscribe(self, mode, callback, topic, lease_seconds=None, secret=''):
+        """Verify a (un)subscription request with the subscriber, then apply it"""
+        lease_seconds = int(lease_seconds or self.default_lease_seconds)
+        challenge = secrets.token_urlsafe(24)
+        params = {'hub.mode': mode, 'hub.topic': topic, 'hub.challenge': challenge}
+        if mode == 'subscribe':
+            params['hub.lease_seconds'] = lease_seconds
+        try:
+            separator = '&' if '?' in callback else '?'
+            response = self.session.get(f"{callback}{separator}{urlencode(params)}", timeout=15)
+        except requests.RequestException as e:
+            print(f"Could not verify {callback}: {e}")
+            return False
+        if not response.ok or response.text.strip() != challenge:
+            print(f"Subscriber {callback} did not confirm {mode} for {topic}")
+            return False
+
+        with self.lock:
+            callbacks = self.subscriptions.setdefault(topic, {})
+            if mode == 'subscribe':
+                callbacks[callback] = {'secret': secret, 'expires': time.time() + lease_seconds}
+            else:
+                callbacks.pop(callback, None)
+        print(f"{mode.capitalize()}d {callback} to {topic}")
+        return True
+
+    def accepts(self, topic):
+        """True if this hub serves the topic"""
+        return topic.startswith(self.topic_prefix)
+
+    def active_subscribers(self, topic):
+        """Return (callback, secret) pairs whose lease has not expired, dropping the expired ones.
+
+        A topic left without subscribers is forgotten, including its item digests.
+        """
+        now = time.time()
+        with self.lock:
+            callbacks = self.subscriptions.get(topic, {})
+            for callback in [c for c, sub in callbacks.items() if sub['expires'] < now]:
+                del callbacks[callback]
+            if not callbacks:
+                self.subscriptions.pop(topic, None)
+                self.item_digests.pop(topic, None)
+            return [(callback, sub['secret']) for callback, sub in callbacks.items()]
+
+    def diff_feed(self, topic, content):
+        """Return an RSS document with only the new or changed items, or None if nothing changed.
+
+        Content that cannot be parsed as RSS is passed on unchanged.
+        """
+        try:
+            root = ET.fromstring(content)
+        except ET.ParseError:
+            return content
+        channel = root.find('channel')
+        if channel is None:
+            return content
+
+        digests = {}
+        changed = []
+        for item in channel.findall('item'):
+            key = item.findtext('guid') or item.findtext('link') or item.findtext('title') or ''
+            digests[key] = hashlib.sha256(ET.tostring(item)).hexdigest()
+            if self.item_digests.get(topic, {}).get(key) != digests[key]:
+                changed.append(item)
+        self.item_digests[topic] = digests
+
+        if not changed:
+            return None
+        diff = copy.deepcopy(root)
+        diff_channel = diff.find('channel')
+        for item in diff_channel.findall('item'):
+            diff_channel.remove(item)
+        for item in changed:
+            diff_channel.append(item)
+        return ET.tostring(diff, encoding='utf-8', xml_declaration=True)
+
+    def deliver(self, callback, secret, topic, body, content_type):
+        """Push content to a single subscriber"""
+        headers = {
+            'Content-Type': content_type,
+            'Link': f'<{self.hub_url}>; rel="hub", <{topic}>; rel="self"',
+        }
+        if secret:
+            signature = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers['X-Hub-Signature'] = f'sha256={signature}'
+        try:
+            response = self.session.post(callback, data=body, headers=headers, timeout=15)
+            response.raise_for_status()
+            return True
+        except requests.RequestException as e:
+            print(f"Delivery to {callback} failed: {e}")
+            return False
+
+    def publish(self, topic):
+        """Fetch a topic and fan the changed items out to its subscribers; returns deliveries made"""
+        if not self.accepts(topic):
+            print(f"Ignoring publish for {topic}: not under {self.topic_prefix}")
+            return 0
+        # Nobody to push to, so there is no reason to fetch the topic at all
+        subscribers = self.active_subscribers(topic)
+        if not subscribers:
+            print(f"No subscribers for {topic}")
+            return 0
+
+        try:
+            response = self.session.get(topic, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Could not fetch {topic}: {e}")
+            return 0
+
+        with self.lock:
+            body = self.diff_feed(topic, response.content)
+        if body is None:
+            print(f"No new or changed items in {topic}")
+            return 0
+
+        content_type = response.headers.get('Content-Type', 'application/rss+xml')
+        futures = [self.pool.submit(self.deliver, callback, secret, topic, body, content_type)
+                   for callback, secret in subscribers]
+        delivered = sum(future.result() for future in futures)
+        print(f"Pushed {topic} to {delivered}/{len(subscribers)} subscribers")
+        return delivered
+
+
+class HubRequestHandler(BaseHTTPRequestHandler):
+    hub = None
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        mode = form.get('hub.mode')
+        topic = form.get('hub.url') or form.get('hub.topic')
+        if topic and not self.hub.accepts(topic):
+            self.send_error(400, 'Topic is not served by this hub')
+            return
+
+        if mode in ('subscribe', 'unsubscribe') and form.get('hub.callback') and form.get('hub.topic'):
+            # Verification of intent happens asynchronously, as the spec allows
+            self.hub.pool.submit(
+                self.hub.subscribe, mode, form['hub.callback'], form['hub.topic'],
+                form.get('hub.lease_seconds'), form.get('hub.secret', '')
+            )
+        elif mode == 'publish' and topic:
+            threading.Thread(target=self.hub.publish, args=(topic,), daemon=True).start()
+        else:
+            self.send_error(400, 'Unsupported or incomplete hub request')
+            return
+
+        self.send_response(202)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a minimal WebSub hub for the generated feeds')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--public-url', help='URL subscribers see for this hub (defaults to http://HOST:PORT/)')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent deliveries and verifications')
+    parser.add_argument('--topic-prefix', default=os.environ.get('FEED_BASE_URL', ''),
+                        help='Only accept topics under this URL (defaults to $FEED_BASE_URL; empty accepts any)')
+    args = parser.parse_args()
+
+    HubRequestHandler.hub = WebSubHub(args.public_url or f"http://{args.host}:{args.port}/", max_workers=args.workers,
+                                      topic_prefix=args.topic_prefix)
+    server = ThreadingHTTPServer((args.host, args.port), HubRequestHandler)
+    print(f"WebSub hub listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,82 @@
+import requests
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+
+class FeedPublisher:
+    """Sends WebSub publish pings for feeds whose content changed since the last ping.
+
+    Meant to run after the feeds are deployed: the hub fetches the topic URL when pinged,
+    so pinging earlier would make it read the previous run's content. The digests of the
+    pinged feeds are kept in a state file; a feed whose ping fails is tried again next run.
+    """
+
+    def __init__(self, hub_url, base_url, state_file):
+        self.hub_url = hub_url
+        self.base_url = base_url.rstrip('/')
+        self.state_file = state_file
+        self.session = requests.Session()
+        self.published = {}
+        if os.path.exists(state_file):
+            with open(state_file, encoding='utf-8') as f:
+                self.published = json.load(f)
+
+    def feed_digests(self, root, patterns):
+        """Return path -> sha256 of every feed file matching the glob patterns, paths relative to root"""
+        digests = {}
+        for pattern in patterns:
+            for path in sorted(glob.glob(os.path.join(root, pattern))):
+                with open(path, 'rb') as f:
+                    digests[os.path.relpath(path, root).replace(os.sep, '/')] = hashlib.sha256(f.read()).hexdigest()
+        return digests
+
+    def ping(self, topic):
+        """Send a publish ping for one topic; returns True when the hub accepted it"""
+        try:
+            response = self.session.post(self.hub_url, data={'hub.mode': 'publish', 'hub.url': topic}, timeout=15)
+            response.raise_for_status()
+            print(f"Notified WebSub hub about {topic}")
+            return True
+        except requests.RequestException as e:
+            print(f"Error notifying WebSub hub about {topic}: {e}")
+            return False
+
+    def publish_changed(self, root, patterns):
+        """Ping the hub for every changed feed and remember what was published; returns pings sent"""
+        sent = 0
+        for path, digest in self.feed_digests(root, patterns).items():
+            if self.published.get(path) == digest:
+                continue
+            if self.ping(f"{self.base_url}/{path}"):
+                self.published[path] = digest
+                sent += 1
+        return sent
+
+    def save(self):
+        tmp_path = f'{self.state_file}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.published, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_file)
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ping a WebSub hub for deployed feeds that changed')
+    parser.add_argument('--hub-url', default=os.environ.get('WEBSUB_HUB_URL', ''), help='Hub to notify (defaults to $WEBSUB_HUB_URL)')
+    parser.add_argument('--base-url', default=os.environ.get('FEED_BASE_URL', ''),
+                        help='Public URL the feeds are published under (defaults to $FEED_BASE_URL)')
+    parser.add_argument('--root', default='.', help='Directory that was deployed')
+    parser.add_argument('--feeds', nargs='+', default=['*/*.xml'], help='Glob patterns of feed files, relative to --root')
+    parser.add_argument('--state', default='.published_feeds.json', help='File with the digests of the feeds last pinged')
+    args = parser.parse_args()
+
+    if not (args.hub_url and args.base_url):
+        print("WEBSUB_HUB_URL or FEED_BASE_URL is not set, nothing to ping")
+    else:
+        publisher = FeedPublisher(args.hub_url, args.base_url, args.state)
+        sent = publisher.publish_changed(args.root, args.feeds)
+        publisher.save()
+        print(f"Sent {sent} publish pings")